@@ -3,6 +3,7 @@ import google.generativeai as genai
 from google.generativeai import types
 import requests
 import io
+import hashlib
 
 st.set_page_config(page_title="Gemini Chat + Vision", page_icon="🧠", layout="wide")
 st.title("🧠 Gemini Chat + Image Recognition (no Cloud Vision)")
@@ -13,22 +14,49 @@ with st.sidebar:
     st.caption("Get one from https://aistudio.google.com/app/apikey")
 
 # --- Initialize Gemini client --------------------------------------------
+@st.cache_resource
+def get_client(key: str):
+    """Build the Gemini client once per API key instead of on every rerun."""
+    return genai.Client(api_key=key)
+
 if api_key:
-    client = genai.Client(api_key=api_key)
+    client = get_client(api_key)
 else:
     st.warning("Please enter your Gemini API key to continue.")
     st.stop()
 
+# --- Cached image loading -------------------------------------------------
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+@st.cache_data(max_entries=4)
+def fetch_image_bytes(url: str) -> bytes:
+    """Download an image once per URL; reruns reuse the cached bytes."""
+    with _session.get(url, stream=True, timeout=(3, 10)) as resp:
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if length and int(length) > MAX_DOWNLOAD_BYTES:
+            raise ValueError("Image is larger than the 20 MB download limit.")
+        data = bytearray()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            data.extend(chunk)
+            if len(data) > MAX_DOWNLOAD_BYTES:
+                raise ValueError("Image is larger than the 20 MB download limit.")
+        return bytes(data)
+
 # --- Upload or link an image ---------------------------------------------
 uploaded_img = st.file_uploader("Upload an image (JPG, PNG)", type=["jpg", "jpeg", "png"])
 url_input = st.text_input("Or paste an image URL")
 
 image_bytes = None
 if uploaded_img is not None:
-    image_bytes = uploaded_img.read()
+    image_bytes = uploaded_img.getvalue()
 elif url_input:
     try:
-        image_bytes = requests.get(url_input).content
+        image_bytes = fetch_image_bytes(url_input)
     except Exception as e:
         st.error(f"Failed to fetch image from URL: {e}")
 
@@ -40,20 +68,28 @@ if st.button("Generate Answer"):
     if not image_bytes:
         st.warning("Please upload or provide an image URL first.")
     else:
-        image_part = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
-        contents = [prompt, image_part]
+        # Re-hit the API only when the question or the image actually changed;
+        # otherwise replay the answer stored in session state.
+        request_key = (prompt, hashlib.sha256(image_bytes).hexdigest())
+        if st.session_state.get("answer_key") != request_key:
+            image_part = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
+            contents = [prompt, image_part]
+
+            with st.spinner("Analyzing image using Gemini..."):
+                try:
+                    response = client.models.generate_content(
+                        model="gemini-2.5-flash",
+                        contents=contents,
+                    )
+                    st.session_state.answer_key = request_key
+                    st.session_state.answer_text = response.text
+                except Exception as e:
+                    st.error(f"Error from Gemini API: {e}")
 
-        with st.spinner("Analyzing image using Gemini..."):
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=contents,
-                )
-                st.image(io.BytesIO(image_bytes), caption="Uploaded Image", use_container_width=True)
-                st.markdown("### 🧩 Gemini’s Response")
-                st.write(response.text)
-            except Exception as e:
-                st.error(f"Error from Gemini API: {e}")
+        if st.session_state.get("answer_key") == request_key:
+            st.image(io.BytesIO(image_bytes), caption="Uploaded Image", use_container_width=True)
+            st.markdown("### 🧩 Gemini’s Response")
+            st.write(st.session_state.answer_text)
 
 st.markdown("---")
 st.markdown("""
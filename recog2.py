@@ -54,6 +54,13 @@ def pdf_to_images(pdf_bytes):
     """Convert PDF to list of PIL images."""
     return convert_from_bytes(pdf_bytes)
 
+def page_preview(pil_image, max_edge=1280):
+    """Downscaled copy for on-screen display only (browser shows <=~1200px
+    anyway); the full-resolution page is still what goes to Gemini."""
+    preview = pil_image.copy()
+    preview.thumbnail((max_edge, max_edge), Image.Resampling.BILINEAR)
+    return preview
+
 # ----------------------------------------------------------
 # User Question
 # ----------------------------------------------------------
@@ -82,7 +89,10 @@ if st.button("🔍 Analyze with Gemini"):
             pages = pdf_to_images(pdf_bytes)
 
             for i, page in enumerate(pages):
-                st.image(page, caption=f"PDF Page {i+1}", use_container_width=True)
+                # JPEG transport: rasterized pages are photographic data, and
+                # st.image's default PNG encode is several times slower.
+                st.image(page_preview(page), caption=f"PDF Page {i+1}",
+                         use_container_width=True, output_format="JPEG")
                 img_bytes = image_to_bytes(page)
                 img_part = types.Part.from_bytes(data=img_bytes, mime_type="image/jpeg")
                 content_parts.append(img_part)
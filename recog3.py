@@ -3,6 +3,8 @@ from google import genai
 from google.genai import types
 import requests
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pdf2image import convert_from_bytes
 from PIL import Image
 
@@ -23,11 +25,16 @@ with st.sidebar:
 # ----------------------------------------------------------
 # Configure Gemini client
 # ----------------------------------------------------------
+@st.cache_resource
+def get_client(key):
+    """Build the Gemini client once per API key instead of on every rerun."""
+    return genai.Client(api_key=key)
+
 if not api_key:
     st.warning("Please provide your Gemini API key in the sidebar to continue.")
     st.stop()
 
-client = genai.Client(api_key=api_key)
+client = get_client(api_key)
 
 # ----------------------------------------------------------
 # Upload Section
@@ -44,14 +51,41 @@ url_input = st.text_input("Or paste an image URL (optional)")
 # ----------------------------------------------------------
 # Helper functions
 # ----------------------------------------------------------
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+def fetch_image_bytes(url):
+    """Stream a URL download with timeouts and a hard size cap."""
+    with _session.get(url, stream=True, timeout=(3, 10)) as resp:
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if length and int(length) > MAX_DOWNLOAD_BYTES:
+            raise ValueError("Image is larger than the 20 MB download limit.")
+        data = bytearray()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            data.extend(chunk)
+            if len(data) > MAX_DOWNLOAD_BYTES:
+                raise ValueError("Image is larger than the 20 MB download limit.")
+        return bytes(data)
+
 def image_to_bytes(pil_image):
+    # Gemini vision works best at <=1568px on the long edge; bigger uploads
+    # just cost bytes and latency, so downscale and recompress first.
+    pil_image.thumbnail((1568, 1568), Image.Resampling.BILINEAR)
     buf = io.BytesIO()
-    pil_image.save(buf, format="JPEG")
+    pil_image.save(buf, format="JPEG", quality=85, subsampling=2, optimize=False)
     return buf.getvalue()
 
-def pdf_to_images(pdf_bytes):
-    """Convert PDF to list of PIL images."""
-    return convert_from_bytes(pdf_bytes)
+@st.cache_data(max_entries=4)
+def pdf_to_images(pdf_bytes, dpi=150):
+    """Convert PDF to a list of JPEG-encoded page bytes (cached per upload)."""
+    pages = convert_from_bytes(pdf_bytes, dpi=dpi, thread_count=os.cpu_count())
+    # libjpeg releases the GIL, so pages encode in parallel across cores.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        return list(ex.map(image_to_bytes, pages))
 
 # ----------------------------------------------------------
 # User Question
@@ -82,16 +116,16 @@ if st.button("🔍 Analyze with Gemini"):
             pdf_bytes = uploaded_file.read()
             pages = pdf_to_images(pdf_bytes)
 
-            for i, page in enumerate(pages):
-                st.image(page, caption=f"PDF Page {i+1}", use_container_width=True)
-                img_bytes = image_to_bytes(page)
+            for i, img_bytes in enumerate(pages):
+                st.image(img_bytes, caption=f"PDF Page {i+1}", use_container_width=True)
                 img_part = types.Part.from_bytes(data=img_bytes, mime_type="image/jpeg")
                 content_parts.append(img_part)
 
     elif url_input:
         file_attached = True
         try:
-            image_bytes = requests.get(url_input).content
+            image_bytes = fetch_image_bytes(url_input)
+            image_bytes = image_to_bytes(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
             st.image(io.BytesIO(image_bytes), caption="Image from URL", use_container_width=True)
             img_part = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
             content_parts.append(img_part)
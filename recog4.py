@@ -4,6 +4,18 @@ import json
 import io
 import zipfile
 import re
+import functools
+import hashlib
+import tempfile
+
+try:
+    import xxhash
+
+    def hash_bytes(data: bytes) -> str:
+        return xxhash.xxh3_64(data).hexdigest()
+except ImportError:
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
 
 # ------------------------ Utility Functions ------------------------
 def init_state():
@@ -11,6 +23,7 @@ def init_state():
         "phase": "collect",
         "user_text": "",
         "uploaded_files": [],
+        "uploaded_sig": None,
         "planning_response": None,
         "planning_answers": {},
         "design_response": None,
@@ -21,11 +34,12 @@ def init_state():
     for k, v in defaults.items():
         st.session_state.setdefault(k, v)
 
-def clean_json_text(raw: str) -> str:
-    """Cleans Gemini output so it's valid JSON."""
-    if not raw:
-        return raw
+# Legacy regex cleaner kept selectable so the scanner below can be
+# diff-tested against it.
+USE_REGEX_CLEANER = False
 
+def clean_json_text_regex(raw: str) -> str:
+    """Original multi-pass regex cleaner (legacy path)."""
     raw = raw.strip()
 
     # Remove Markdown code fences like ```json ... ```
@@ -44,27 +58,94 @@ def clean_json_text(raw: str) -> str:
 
     return raw.strip()
 
+def strip_fences(s: str) -> str:
+    """Peel a leading ```/```json fence, a trailing fence, and a bare "json"
+    prefix by slicing — no pattern matching needed."""
+    if s.startswith("```"):
+        nl = s.find("\n")
+        s = s[nl + 1:] if nl != -1 else s[3:]
+    if s.endswith("```"):
+        s = s[:-3].rstrip()
+    if s[:4].lower() == "json":
+        s = s[4:].lstrip("\n\r ")
+    return s
+
+def clean_json_text(raw: str) -> str:
+    """Cleans Gemini output so it's valid JSON — one linear scan, no regex."""
+    if not raw:
+        return raw
+    if USE_REGEX_CLEANER:
+        return clean_json_text_regex(raw)
+
+    s = strip_fences(raw.strip())
+
+    # Unescape \" first (mirrors the legacy replace), then drop trailing
+    # commas before ]/} in one pass that tracks string/escape state so a
+    # comma inside a quoted value is never touched.
+    s = s.replace('\\"', '"')
+    if "," not in s:
+        return s.strip()
+    out = []
+    in_str = False
+    esc = False
+    i, n = 0, len(s)
+    while i < n:
+        c = s[i]
+        if in_str:
+            out.append(c)
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == ",":
+            j = i + 1
+            while j < n and s[j] in " \t\r\n":
+                j += 1
+            if j < n and s[j] in "]}":
+                i = j
+                continue
+            out.append(c)
+        else:
+            if c == '"':
+                in_str = True
+            out.append(c)
+        i += 1
+    return "".join(out).strip()
+
+@functools.lru_cache(maxsize=32)
 def parse_gemini_json(raw_text: str):
-    """Try to parse Gemini JSON safely, retry after cleaning."""
+    """Try to parse Gemini JSON safely, repairing only what actually failed."""
     raw_text = raw_text.strip()
     if not raw_text:
         raise ValueError("Empty Gemini response")
 
     try:
         return json.loads(raw_text)
-    except json.JSONDecodeError:
-        cleaned = clean_json_text(raw_text)
-        return json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        # A fence at the failure point is the common case — try stripping
+        # just that before paying for the full cleaning pass.
+        if e.msg.startswith("Expecting value") and raw_text[e.pos : e.pos + 1] == "`":
+            try:
+                return json.loads(strip_fences(raw_text))
+            except json.JSONDecodeError:
+                pass
+        return json.loads(clean_json_text(raw_text))
+
+@st.cache_resource
+def get_client(key):
+    """Build the Gemini client once per API key instead of on every rerun."""
+    return genai.Client(api_key=key)
 
 def zip_project(files_dict):
-    path = "generated_project.zip"
-    with zipfile.ZipFile(path, "w") as zf:
+    """Build the project ZIP in memory; store already-compressed assets as-is."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
         for name, content in files_dict.items():
-            if isinstance(content, str):
-                zf.writestr(name, content)
-            else:
-                zf.writestr(name, content)
-    return path
+            stored = name.lower().endswith((".png", ".jpg", ".jpeg", ".pdf", ".zip"))
+            zf.writestr(name, content, compress_type=zipfile.ZIP_STORED if stored else None)
+    return buf.getvalue()
 
 # ------------------------ Streamlit Setup ------------------------
 st.set_page_config(page_title="🧠 Streamlit Project Maker", layout="wide")
@@ -84,7 +165,7 @@ if not api_key:
     st.warning("⚠️ Enter Gemini API key to continue.")
     st.stop()
 
-client = genai.Client(api_key=api_key)
+client = get_client(api_key)
 
 # ------------------------ Layout ------------------------
 col1, col2 = st.columns([1, 2])
@@ -101,10 +182,24 @@ with col1:
         accept_multiple_files=True,
         type=["png", "jpg", "jpeg", "pdf", "py", "txt", "md"],
     )
+    # Re-ingest only when the uploaded file set actually changed — the
+    # uploader stays truthy on every rerun otherwise.
     if uploaded:
-        st.session_state.uploaded_files = [
-            {"name": f.name, "type": f.type, "bytes": f.read()} for f in uploaded
-        ]
+        sig = tuple((f.name, f.size) for f in uploaded)
+        if sig != st.session_state.uploaded_sig:
+            # Keep only a hash + temp-file path in session state so reruns never
+            # re-hash multi-MB buffers; bytes are read back only when zipping.
+            ingested = []
+            for f in uploaded:
+                data = f.getvalue()
+                tmp = tempfile.NamedTemporaryFile(delete=False)
+                tmp.write(data)
+                tmp.close()
+                ingested.append(
+                    {"name": f.name, "type": f.type, "hash": hash_bytes(data), "path": tmp.name}
+                )
+            st.session_state.uploaded_files = ingested
+            st.session_state.uploaded_sig = sig
 
     if st.session_state.uploaded_files:
         st.markdown("**Files uploaded:**")
@@ -313,7 +408,8 @@ Return ONLY valid Python code (no markdown or comments).
                         "README.md": "# Auto-generated Streamlit Project\nCreated via Gemini Project Maker.",
                     }
                     for f in st.session_state.uploaded_files:
-                        files[f["name"]] = f["bytes"]
+                        with open(f["path"], "rb") as fh:
+                            files[f["name"]] = fh.read()
                     st.session_state.project_files = files
                     st.rerun()
                 except Exception as e:
@@ -330,14 +426,12 @@ Return ONLY valid Python code (no markdown or comments).
             with st.expander("🔍 Preview Code"):
                 st.code(st.session_state.generated_code, language="python")
 
-            zip_path = zip_project(st.session_state.project_files)
-            with open(zip_path, "rb") as f:
-                st.download_button(
-                    "📦 Download Full Project (ZIP)",
-                    data=f,
-                    file_name="generated_project.zip",
-                    mime="application/zip",
-                )
+            st.download_button(
+                "📦 Download Full Project (ZIP)",
+                data=zip_project(st.session_state.project_files),
+                file_name="generated_project.zip",
+                mime="application/zip",
+            )
 
             if st.button("🔁 Start New Project"):
                 for k in list(st.session_state.keys()):
@@ -1,36 +1,157 @@
 import streamlit as st
-from google import genai
 import json
 import io
-import zipfile
 import re
+import hashlib
+import os
+import pathlib
+import time
+
+try:
+    import orjson
+
+    def _loads(s):
+        return orjson.loads(s)
+
+    def _dumps(obj, indent=False):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+except ImportError:  # stdlib fallback — slower but identical behavior
+    def _loads(s):
+        return json.loads(s)
+
+    def _dumps(obj, indent=False):
+        if indent:
+            return json.dumps(obj, indent=2)
+        return json.dumps(obj, separators=(",", ":"))
+
+# Compiled once at import; clean_json_text runs on every Gemini response.
+_FENCE_RE = re.compile(r"^```(?:json)?|```$", re.IGNORECASE | re.MULTILINE)
+_JSON_PREFIX_RE = re.compile(r"^json\s*", re.IGNORECASE)
+
+def _strip_trailing_commas(s: str) -> str:
+    """Drop commas that directly precede ]/} in one linear scan.
+
+    Unlike the old regex this tracks string boundaries, so commas inside
+    quoted values are never touched, and it short-circuits when the
+    payload has no commas at all.
+    """
+    if "," not in s:
+        return s
+    out = []
+    in_str = False
+    esc = False
+    i, n = 0, len(s)
+    while i < n:
+        c = s[i]
+        if in_str:
+            out.append(c)
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == ",":
+            j = i + 1
+            while j < n and s[j] in " \t\r\n":
+                j += 1
+            if j < n and s[j] in "]}":
+                i = j
+                continue
+            out.append(c)
+        else:
+            if c == '"':
+                in_str = True
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+@st.cache_resource(show_spinner=False)
+def _get_client(key):
+    # Cached per API key: the Client holds live connection state, so
+    # cache_resource (not cache_data) is the right primitive.
+    # google-genai drags in grpc/protobuf — defer the import until the user
+    # has actually supplied an API key so first paint stays fast.
+    from google import genai
+
+    return genai.Client(api_key=key)
+
+# Content-addressed cache of Gemini responses: repeat runs of an identical
+# prompt become a disk read instead of a multi-second API round-trip.
+_CACHE = pathlib.Path(os.getenv("GEMINI_CACHE", ".gemini_cache"))
+
+def _cache_path(model, prompt):
+    key = hashlib.blake2b(f"{model}\0{prompt}".encode(), digest_size=16).hexdigest()
+    return _CACHE / key
+
+def _cached_generate(client, model, prompt):
+    path = _cache_path(model, prompt)
+    if path.exists():
+        return path.read_text()
+    resp = client.models.generate_content(model=model, contents=[prompt])
+    text = getattr(resp, "text", "").strip()
+    _CACHE.mkdir(exist_ok=True)
+    path.write_text(text)
+    return text
+
 # -------------------- Utility Functions --------------------
+# Hoisted to module scope so the dict isn't rebuilt on every rerun.
+_DEFAULTS = {
+    "phase": "collect",
+    "user_text": "",
+    "line_range": "",
+    "uploaded_files": [],
+    "_uploaded_sig": None,
+    "planning_response": None,
+    "planning_answers": {},
+    "design_response": None,
+    "design_answers": {},
+    "generated_code": None,
+    "generated_code_bytes": None,
+    "project_files": {},
+}
+
 def init_state():
-    defaults = {
-        "phase": "collect",
-        "user_text": "",
-        "line_range": "",
-        "uploaded_files": [],
-        "planning_response": None,
-        "planning_answers": {},
-        "design_response": None,
-        "design_answers": {},
-        "generated_code": None,
-        "project_files": {},
-    }
-    for k, v in defaults.items():
-        st.session_state.setdefault(k, v)
+    ss = st.session_state  # one proxy lookup instead of one per key
+    for k, v in _DEFAULTS.items():
+        if k not in ss:
+            # copy mutable defaults so sessions never share a list/dict
+            ss[k] = v.copy() if isinstance(v, (list, dict)) else v
+
+def _render_questions(questions, answers, prefix):
+    """Render a phase's multiselect grid and record the answers."""
+    ms = st.multiselect  # local binding: LOAD_FAST beats LOAD_GLOBAL+LOAD_ATTR
+    for q in questions:
+        key = f"{prefix}{q['id']}"
+        answers[key] = ms(f"{q['id']}. {q['question']}", q.get("options", []), key=key)
+
 def clean_json_text(raw: str) -> str:
     """Cleans Gemini output to make it JSON-compatible."""
     if not raw:
         return raw
-    raw = raw.strip()
-    raw = re.sub(r"^```(?:json)?", "", raw, flags=re.IGNORECASE | re.MULTILINE)
-    raw = re.sub(r"```$", "", raw.strip(), flags=re.MULTILINE)
-    if raw.lower().startswith("json"):
-        raw = raw[4:].lstrip("\n\r ")
+    s = raw.strip()
+    # Bare object/array payloads (the common case) skip the fence regexes
+    # entirely; only the cheap short-circuiting repairs run. The cleaner is
+    # only ever called after a parse failure, so we can't return s as-is.
+    if s and s[0] in "{[" and s[-1] in "}]" and "```" not in s[:8]:
+        return _strip_trailing_commas(s.replace('\\"', '"')).strip()
+    # One opening fence at the start and one closing fence at the end is the
+    # overwhelmingly common malformation — peel it with plain slicing and
+    # keep the regexes for genuinely messy responses.
+    if s.startswith("```"):
+        nl = s.find("\n")
+        body = s[nl + 1:] if nl != -1 else s[3:]
+        if body.endswith("```"):
+            body = body[:-3]
+        body = body.strip()
+        if body.lower().startswith("json"):
+            body = body[4:].lstrip()
+        if "```" not in body:
+            return _strip_trailing_commas(body.replace('\\"', '"')).strip()
+    raw = _FENCE_RE.sub("", s)
+    raw = _JSON_PREFIX_RE.sub("", raw.strip(), count=1)
     raw = raw.replace('\\"', '"')
-    raw = re.sub(r",\s*([\]}])", r"\1", raw)
+    raw = _strip_trailing_commas(raw)
     return raw.strip()
 
 def parse_gemini_json(raw_text: str):
@@ -39,20 +160,103 @@ def parse_gemini_json(raw_text: str):
     if not raw_text:
         raise ValueError("Empty Gemini response")
     try:
-        return json.loads(raw_text)
+        return _loads(raw_text)
     except json.JSONDecodeError:
         cleaned = clean_json_text(raw_text)
-        return json.loads(cleaned)
+        return _loads(cleaned)
+
+# Encoded once at module scope so the zip path never re-encodes it.
+_README_BYTES = (
+    b"# Auto-generated Streamlit Project\n"
+    b"Created via Gemini Project Maker (Advanced Edition)."
+)
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60, max_entries=8)
+def _zip_entries(entries):
+    import zipfile
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for name, content in entries:
+            zf.writestr(name, content if isinstance(content, (bytes, bytearray)) else content.encode())
+    return buf.getvalue()
 
 def zip_project(files_dict):
-    path = "generated_project.zip"
-    with zipfile.ZipFile(path, "w") as zf:
-        for name, content in files_dict.items():
-            if isinstance(content, str):
-                zf.writestr(name, content)
-            else:
-                zf.writestr(name, content)
-    return path
+    """Build the project archive in memory and return its bytes (cached, so
+    only the first rerun after generation pays the deflate cost)."""
+    return _zip_entries(tuple(sorted(files_dict.items())))
+
+# -------------------- Prompt Templates --------------------
+# Module-level constants: the triple-quoted literals are materialized once at
+# import instead of being rebuilt on every rerun; only the small .format()
+# output is allocated when a phase actually runs.
+PLANNING_PROMPT = """
+You are an expert AI project planner.
+
+User wants to create a Streamlit project with the following idea:
+{user_text}
+
+The code should roughly stay within {line_range} lines.
+
+TASK:
+1. Produce a structured project plan (brief and actionable).
+2. Generate 10–15 multiple-choice questions (multi-select allowed)
+   to clarify planning and add new useful features the user might like.
+3. Suggest 1 short additional text input for user notes.
+
+Return STRICT JSON in this format:
+{{
+  "plan_text": "Project plan summary...",
+  "questions": [
+    {{
+      "id": 1,
+      "question": "Question text",
+      "options": ["Option A","Option B","Option C","Option D"]
+    }}
+  ],
+  "additional_prompt": "Extra notes question"
+}}
+Return ONLY valid JSON. No markdown or ``` fences.
+"""
+
+DESIGN_PROMPT = """
+You are designing a modern, visually appealing Streamlit app.
+
+User idea: {user_text}
+Planning Summary: {plan_text}
+Planning Answers: {planning_answers}
+
+TASK:
+1. Suggest UI layout, themes, interactions, and visual design improvements.
+2. Generate 10–15 multiple-choice questions (multi-select possible)
+   about design preferences and new features the app could include.
+3. Return STRICT JSON like:
+{{
+  "design_text": "Design overview...",
+  "questions": [{{"id":1,"question":"...","options":["A","B","C","D"]}}],
+  "additional_prompt": "Extra notes question"
+}}
+No markdown, no code fences.
+"""
+
+CODE_PROMPT = """
+You are a senior Python developer and UI designer.
+
+Generate a Streamlit project named `generated_app.py`
+based on the following information:
+
+User Idea: {user_text}
+Line Range: {line_range}
+Planning: {planning}
+Design: {design}
+
+Requirements:
+- Keep the total code roughly within {line_range} lines.
+- Create a **beautiful, modern UI** with clean layout, spacing, color theme,
+  and simple animations (if applicable).
+- Use clear section titles, icons, and good UX structure.
+- Do not include markdown or explanations — return ONLY valid Python code.
+"""
 
 # -------------------- Streamlit App --------------------
 st.set_page_config(page_title="🧠 Streamlit Project Maker", layout="wide")
@@ -72,7 +276,7 @@ if not api_key:
     st.warning("⚠️ Enter Gemini API key to continue.")
     st.stop()
 
-client = genai.Client(api_key=api_key)
+client = _get_client(api_key)
 
 col1, col2 = st.columns([1, 2])
 
@@ -93,9 +297,15 @@ with col1:
         type=["png", "jpg", "jpeg", "pdf", "py", "txt", "md"],
     )
     if uploaded:
-        st.session_state.uploaded_files = [
-            {"name": f.name, "type": f.type, "bytes": f.read()} for f in uploaded
-        ]
+        # The uploader stays truthy on every rerun; only re-read the bytes
+        # when the file set itself changes. getvalue() returns the buffered
+        # contents without advancing the cursor.
+        sig = tuple((f.name, f.size) for f in uploaded)
+        if sig != st.session_state._uploaded_sig:
+            st.session_state.uploaded_files = [
+                {"name": f.name, "type": f.type, "bytes": f.getvalue()} for f in uploaded
+            ]
+            st.session_state._uploaded_sig = sig
 
     if st.session_state.uploaded_files:
         st.markdown("**Files uploaded:**")
@@ -109,8 +319,7 @@ with col1:
             st.rerun()
     else:
         if st.button("⏪ Reset Project"):
-            for k in list(st.session_state.keys()):
-                del st.session_state[k]
+            st.session_state.clear()
             init_state()
             st.rerun()
 
@@ -123,47 +332,25 @@ with col2:
         st.subheader("📘 Planning Phase")
 
         if not st.session_state.planning_response:
-            planning_prompt = f"""
-You are an expert AI project planner.
-
-User wants to create a Streamlit project with the following idea:
-{st.session_state.user_text}
-
-The code should roughly stay within {st.session_state.line_range} lines.
-
-TASK:
-1. Produce a structured project plan (brief and actionable).
-2. Generate 10–15 multiple-choice questions (multi-select allowed) 
-   to clarify planning and add new useful features the user might like.
-3. Suggest 1 short additional text input for user notes.
-
-Return STRICT JSON in this format:
-{{
-  "plan_text": "Project plan summary...",
-  "questions": [
-    {{
-      "id": 1,
-      "question": "Question text",
-      "options": ["Option A","Option B","Option C","Option D"]
-    }}
-  ],
-  "additional_prompt": "Extra notes question"
-}}
-Return ONLY valid JSON. No markdown or ``` fences.
-"""
+            planning_prompt = PLANNING_PROMPT.format(
+                user_text=st.session_state.user_text,
+                line_range=st.session_state.line_range,
+            )
             with st.spinner("🧠 Gemini is preparing your planning questions..."):
+                # st.rerun() raises RerunException, so it must stay outside
+                # this try — otherwise the handler fires on success, unlinks
+                # the freshly cached response and the cache never hits.
                 try:
-                    resp = client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=[planning_prompt],
-                    )
-                    raw_text = getattr(resp, "text", "").strip()
+                    raw_text = _cached_generate(client, "gemini-2.5-flash", planning_prompt)
                     parsed = parse_gemini_json(raw_text)
-                    st.session_state.planning_response = parsed
-                    st.rerun()
                 except Exception as e:
+                    # Drop the cached entry so a retry gets a fresh API call
+                    # instead of replaying the same bad response forever.
+                    _cache_path("gemini-2.5-flash", planning_prompt).unlink(missing_ok=True)
                     st.error(f"⚠️ Gemini returned invalid JSON or error: {e}")
                     st.stop()
+            st.session_state.planning_response = parsed
+            st.rerun()
 
         else:
             data = st.session_state.planning_response
@@ -171,60 +358,45 @@ Return ONLY valid JSON. No markdown or ``` fences.
             st.write(data.get("plan_text", ""))
 
             st.markdown("### 📋 Planning Questions")
-            for q in data.get("questions", []):
-                key = f"plan_q_{q['id']}"
-                st.session_state.planning_answers[key] = st.multiselect(
-                    f"{q['id']}. {q['question']}",
-                    q.get("options", []),
-                    key=key,
+            # A form batches all the answers into one rerun on submit instead
+            # of a full script rerun per multiselect change.
+            with st.form("planning_form"):
+                _render_questions(
+                    data.get("questions", []), st.session_state.planning_answers, "plan_q_"
                 )
 
-            st.session_state.planning_answers["plan_additional"] = st.text_area(
-                data.get("additional_prompt", "Any other notes?"),
-                value=st.session_state.planning_answers.get("plan_additional", ""),
-            )
+                st.session_state.planning_answers["plan_additional"] = st.text_area(
+                    data.get("additional_prompt", "Any other notes?"),
+                    value=st.session_state.planning_answers.get("plan_additional", ""),
+                )
 
-            if st.button("✅ Confirm Planning → Designing"):
-                st.session_state.phase = "designing"
-                st.rerun()
+                if st.form_submit_button("✅ Confirm Planning → Designing"):
+                    st.session_state.phase = "designing"
+                    st.rerun()
 
     # -------- DESIGNING PHASE --------
     elif st.session_state.phase == "designing":
         st.subheader("🎨 Designing Phase")
 
         if not st.session_state.design_response:
-            design_prompt = f"""
-You are designing a modern, visually appealing Streamlit app.
-
-User idea: {st.session_state.user_text}
-Planning Summary: {st.session_state.planning_response.get('plan_text','')}
-Planning Answers: {json.dumps(st.session_state.planning_answers, indent=2)}
-
-TASK:
-1. Suggest UI layout, themes, interactions, and visual design improvements.
-2. Generate 10–15 multiple-choice questions (multi-select possible)
-   about design preferences and new features the app could include.
-3. Return STRICT JSON like:
-{{
-  "design_text": "Design overview...",
-  "questions": [{{"id":1,"question":"...","options":["A","B","C","D"]}}],
-  "additional_prompt": "Extra notes question"
-}}
-No markdown, no code fences.
-"""
+            design_prompt = DESIGN_PROMPT.format(
+                user_text=st.session_state.user_text,
+                plan_text=st.session_state.planning_response.get("plan_text", ""),
+                planning_answers=_dumps(st.session_state.planning_answers),
+            )
             with st.spinner("🎨 Gemini is creating design options..."):
+                # As in planning: st.rerun() raises, so it lives below the try.
                 try:
-                    resp = client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=[design_prompt],
-                    )
-                    raw = getattr(resp, "text", "").strip()
+                    raw = _cached_generate(client, "gemini-2.5-flash", design_prompt)
                     parsed = parse_gemini_json(raw)
-                    st.session_state.design_response = parsed
-                    st.rerun()
                 except Exception as e:
+                    # Same as planning: never leave an unparseable response
+                    # sitting in the cache.
+                    _cache_path("gemini-2.5-flash", design_prompt).unlink(missing_ok=True)
                     st.error(f"⚠️ Gemini JSON parse error: {e}")
                     st.stop()
+            st.session_state.design_response = parsed
+            st.rerun()
 
         else:
             data = st.session_state.design_response
@@ -232,22 +404,19 @@ No markdown, no code fences.
             st.write(data.get("design_text", ""))
 
             st.markdown("### 🎛️ Design Questions")
-            for q in data.get("questions", []):
-                key = f"design_q_{q['id']}"
-                st.session_state.design_answers[key] = st.multiselect(
-                    f"{q['id']}. {q['question']}",
-                    q.get("options", []),
-                    key=key,
+            with st.form("design_form"):
+                _render_questions(
+                    data.get("questions", []), st.session_state.design_answers, "design_q_"
                 )
 
-            st.session_state.design_answers["design_additional"] = st.text_area(
-                data.get("additional_prompt", "Any other notes?"),
-                value=st.session_state.design_answers.get("design_additional", ""),
-            )
+                st.session_state.design_answers["design_additional"] = st.text_area(
+                    data.get("additional_prompt", "Any other notes?"),
+                    value=st.session_state.design_answers.get("design_additional", ""),
+                )
 
-            if st.button("✅ Confirm Design → Finalize"):
-                st.session_state.phase = "finalize"
-                st.rerun()
+                if st.form_submit_button("✅ Confirm Design → Finalize"):
+                    st.session_state.phase = "finalize"
+                    st.rerun()
 
     # -------- FINALIZE --------
     elif st.session_state.phase == "finalize":
@@ -270,44 +439,75 @@ No markdown, no code fences.
         st.subheader("⚙️ Generating Code")
 
         if not st.session_state.generated_code:
-            code_prompt = f"""
-You are a senior Python developer and UI designer.
-
-Generate a Streamlit project named `generated_app.py`
-based on the following information:
-
-User Idea: {st.session_state.user_text}
-Line Range: {st.session_state.line_range}
-Planning: {json.dumps(st.session_state.planning_response)}
-Design: {json.dumps(st.session_state.design_response)}
-
-Requirements:
-- Keep the total code roughly within {st.session_state.line_range} lines.
-- Create a **beautiful, modern UI** with clean layout, spacing, color theme, 
-  and simple animations (if applicable).
-- Use clear section titles, icons, and good UX structure.
-- Do not include markdown or explanations — return ONLY valid Python code.
-"""
-            with st.spinner("💻 Generating high-quality Streamlit project..."):
-                try:
-                    resp = client.models.generate_content(
+            code_prompt = CODE_PROMPT.format(
+                user_text=st.session_state.user_text,
+                line_range=st.session_state.line_range,
+                planning=_dumps(st.session_state.planning_response),
+                design=_dumps(st.session_state.design_response),
+            )
+            placeholder = st.empty()
+            cache_file = _cache_path("gemini-2.5-flash", code_prompt)
+            try:
+                if cache_file.exists():
+                    code = cache_file.read_text()
+                else:
+                    stream = client.models.generate_content_stream(
                         model="gemini-2.5-flash",
                         contents=[code_prompt],
                     )
-                    code = getattr(resp, "text", "").strip()
-                    st.session_state.generated_code = code
-
-                    files = {
-                        "generated_app.py": code,
-                        "README.md": "# Auto-generated Streamlit Project\nCreated via Gemini Project Maker (Advanced Edition).",
-                    }
-                    for f in st.session_state.uploaded_files:
-                        files[f["name"]] = f["bytes"]
-                    st.session_state.project_files = files
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Gemini error during code generation: {e}")
-                    st.stop()
+                    buf = []
+                    total = 0
+                    # Smoothing is perceived-latency polish only — cap the
+                    # deliberate sleep so streaming is never slower than the
+                    # blocking call it replaced, and stop animating once a
+                    # few KB are on screen (re-rendering the whole file per
+                    # tiny slice gets quadratic fast).
+                    anim_budget = 1.5  # seconds
+                    for chunk in stream:
+                        text = getattr(chunk, "text", "") or ""
+                        if not text:
+                            continue
+                        if len(text) > 50 and anim_budget > 0 and total < 4096:
+                            i = 0
+                            while i < len(text) and anim_budget > 0:
+                                buf.append(text[i:i + 200])
+                                i += 200
+                                placeholder.code("".join(buf), language="python")
+                                time.sleep(0.02)
+                                anim_budget -= 0.02
+                            if i < len(text):
+                                buf.append(text[i:])
+                                placeholder.code("".join(buf), language="python")
+                        else:
+                            buf.append(text)
+                            placeholder.code("".join(buf), language="python")
+                        total += len(text)
+                    code = "".join(buf).strip()
+                    # Cache only a non-empty result — caching "" would turn
+                    # the generated_code falsy-check into an infinite
+                    # rerun/cache-hit loop.
+                    if code:
+                        _CACHE.mkdir(exist_ok=True)
+                        cache_file.write_text(code)
+            except Exception as e:
+                cache_file.unlink(missing_ok=True)
+                st.error(f"Gemini error during code generation: {e}")
+                st.stop()
+
+            # Outside the try: st.rerun() raises RerunException, which the
+            # handler above would otherwise catch and treat as a failure.
+            st.session_state.generated_code = code
+            # Encode once; the zip path reuses these bytes on every rerun.
+            st.session_state.generated_code_bytes = code.encode("utf-8")
+
+            files = {
+                "generated_app.py": st.session_state.generated_code_bytes,
+                "README.md": _README_BYTES,
+            }
+            for f in st.session_state.uploaded_files:
+                files[f["name"]] = f["bytes"]
+            st.session_state.project_files = files
+            st.rerun()
 
         else:
             st.success("✅ Code generated successfully!")
@@ -320,18 +520,15 @@ Requirements:
             with st.expander("🔍 Preview Code"):
                 st.code(st.session_state.generated_code, language="python")
 
-            zip_path = zip_project(st.session_state.project_files)
-            with open(zip_path, "rb") as f:
-                st.download_button(
-                    "📦 Download Full Project (ZIP)",
-                    data=f,
-                    file_name="generated_project.zip",
-                    mime="application/zip",
-                )
+            st.download_button(
+                "📦 Download Full Project (ZIP)",
+                data=zip_project(st.session_state.project_files),
+                file_name="generated_project.zip",
+                mime="application/zip",
+            )
 
             if st.button("🔁 Start New Project"):
-                for k in list(st.session_state.keys()):
-                    del st.session_state[k]
+                st.session_state.clear()
                 init_state()
                 st.rerun()
 